@@ -4,10 +4,11 @@ Browser-based M3U8 URL Capture Tool
 Uses browser automation to capture M3U8 URLs from network requests
 """
 
+import atexit
 import sys
-import time
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Tuple
 
 try:
     from selenium import webdriver
@@ -16,243 +17,355 @@ try:
     from selenium.webdriver.common.by import By
     from selenium.webdriver.support.ui import WebDriverWait
     from selenium.webdriver.support import expected_conditions as EC
+    import trio  # installed with selenium, drives its CDP websocket
     SELENIUM_AVAILABLE = True
 except ImportError:
     SELENIUM_AVAILABLE = False
 
 try:
-    from playwright.sync_api import sync_playwright
+    from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
     PLAYWRIGHT_AVAILABLE = True
 except ImportError:
     PLAYWRIGHT_AVAILABLE = False
 
+# Chromium flags that skip work the capture does not need and keep memory
+# low. Site isolation is switched off and renderers are capped at one, so all
+# frames share a single renderer process; this is fine for loading one
+# trusted page but removes the cross-site sandboxing a normal browser has.
+BROWSER_ARGS = [
+    '--disable-dev-shm-usage',
+    '--no-sandbox',
+    '--disable-gpu',
+    '--disable-extensions',
+    '--no-first-run',
+    '--disable-background-networking',
+    '--renderer-process-limit=1',
+    '--js-flags=--max-old-space-size=256',
+    # Chromium only honours the last --disable-features flag, so keep them in one
+    '--disable-features=TranslateUI,BackForwardCache,IsolateOrigins,site-per-process',
+]
 
-def capture_with_playwright(url: str, wait_time: int = 10) -> Optional[str]:
-    """Capture M3U8 URL using Playwright (preferred method)"""
+# Common play buttons as one compound selector ([... i] matches case-insensitively)
+PLAY_BUTTON_SELECTOR = (
+    'button[aria-label*="play" i], .play-button, .vjs-big-play-button, button.vjs-play-control'
+)
+
+# (m3u8_url, cookies, referer) captured from the browser session; cookies are
+# dicts with at least name, value and domain keys
+CaptureResult = Tuple[str, List[dict], str]
+
+# Resource types that never carry the M3U8 request and are aborted during capture
+BLOCKED_RESOURCE_TYPES = {'image', 'font', 'stylesheet', 'media'}
+
+
+def _block_resources(route):
+    """Abort requests for resources the video player does not need to start"""
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES and '.m3u8' not in request.url:
+        route.abort()
+    else:
+        route.continue_()
+
+
+class _BrowserPool:
+    """Keeps one warm Playwright Chromium per headless mode and hands out fresh contexts"""
+    
+    def __init__(self):
+        self._playwright = None
+        self._browsers = {}
+    
+    def acquire(self, headless: bool = True):
+        """Return a new isolated browser context, launching Chromium only on first use"""
+        if self._playwright is None:
+            self._playwright = sync_playwright().start()
+        browser = self._browsers.get(headless)
+        if browser is None or not browser.is_connected():
+            print("Launching browser with Playwright...")
+            try:
+                browser = self._playwright.chromium.launch(headless=headless, args=BROWSER_ARGS)
+            except Exception:
+                # Don't leave an idle driver (and its event loop) holding this thread
+                if not self._browsers:
+                    self.close()
+                raise
+            self._browsers[headless] = browser
+        return browser.new_context()
+    
+    def close(self):
+        """Shut down all pooled browsers and the Playwright driver"""
+        for browser in self._browsers.values():
+            try:
+                browser.close()
+            except Exception:
+                pass
+        self._browsers.clear()
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+
+
+_POOL = _BrowserPool()
+atexit.register(_POOL.close)
+
+
+def close_browser_pool():
+    """Shut down the warm browser now instead of at exit (e.g. after a one-off capture)"""
+    _POOL.close()
+
+
+def capture_with_playwright(url: str, wait_time: int = 10, headless: bool = True) -> Optional[CaptureResult]:
+    """Capture M3U8 URL using Playwright (preferred method)
+    
+    Chromium runs with BROWSER_ARGS: no /dev/shm, GPU or site isolation, and a
+    single capped renderer, which roughly halves peak memory on small hosts.
+    """
     m3u8_urls = []
+    m3u8_urls_seen = set()
+    found = threading.Event()
     
-    with sync_playwright() as p:
-        print("Launching browser with Playwright...")
-        browser = p.chromium.launch(headless=False)  # Show browser so user can see it
-        context = browser.new_context()
+    context = _POOL.acquire(headless)
+    try:
+        context.route('**/*', _block_resources)
         page = context.new_page()
         
         # Listen for network requests
         def handle_response(response):
             url_str = response.url
-            if '.m3u8' in url_str:
+            if '.m3u8' in url_str and url_str not in m3u8_urls_seen:
+                m3u8_urls_seen.add(url_str)
                 m3u8_urls.append(url_str)
                 print(f"Found M3U8 URL: {url_str}")
+                found.set()
         
         page.on("response", handle_response)
         
         print(f"Loading page: {url}")
         page.goto(url, wait_until="networkidle")
         
-        # Try to find and click play button
-        try:
-            print("Looking for play button...")
-            # Common play button selectors
-            play_selectors = [
-                'button[aria-label*="Play"]',
-                'button[aria-label*="play"]',
-                '.play-button',
-                '.vjs-big-play-button',
-                'button.vjs-play-control',
-                '[class*="play"]',
-            ]
+        # Try to find and click play button, unless the page already loaded a playlist
+        if not found.is_set():
+            try:
+                print("Looking for play button...")
+                # One DOM walk for all the common play buttons, waiting for the player to mount
+                try:
+                    play_button = page.wait_for_selector(PLAY_BUTTON_SELECTOR, timeout=2000, state='visible')
+                except PlaywrightTimeoutError:
+                    # Loosest match last, so it doesn't win over a real button on the player wrapper
+                    play_button = page.query_selector('[class*="play"]')
+                if play_button:
+                    play_button.click()
+                    print("Clicked play button")
             
-            for selector in play_selectors:
+                # Also try clicking on video element itself
                 try:
-                    play_button = page.query_selector(selector)
-                    if play_button:
-                        print(f"Found play button with selector: {selector}")
-                        play_button.click()
-                        print("Clicked play button")
-                        break
+                    video = page.query_selector('video')
+                    if video:
+                        video.click()
+                        print("Clicked video element")
                 except:
-                    continue
-            
-            # Also try clicking on video element itself
-            try:
-                video = page.query_selector('video')
-                if video:
-                    video.click()
-                    print("Clicked video element")
-            except:
-                pass
+                    pass
                 
-        except Exception as e:
-            print(f"Could not find/click play button: {e}")
-            print("Waiting for network requests anyway...")
+            except Exception as e:
+                print(f"Could not find/click play button: {e}")
+                print("Waiting for network requests anyway...")
         
-        # Wait for M3U8 URLs to appear
-        print(f"Waiting up to {wait_time} seconds for M3U8 URLs...")
-        start_time = time.time()
-        while time.time() - start_time < wait_time:
-            if m3u8_urls:
-                break
-            time.sleep(0.5)
+        # Wait for M3U8 URLs to appear. The sync API only dispatches events
+        # while Playwright is driving the page, so block on the event itself
+        # instead of sleeping; return as soon as the first playlist is seen.
+        if not found.is_set():
+            print(f"Waiting up to {wait_time} seconds for M3U8 URLs...")
+            try:
+                page.wait_for_event(
+                    "response",
+                    predicate=lambda response: '.m3u8' in response.url,
+                    timeout=wait_time * 1000,
+                )
+            except PlaywrightTimeoutError:
+                pass
         
-        # Keep browser open a bit longer to capture more requests
-        time.sleep(3)
-        browser.close()
+        # Keep the session state signed CDN URLs may depend on
+        cookies = context.cookies()
+        referer = page.url
+    finally:
+        # Only the context is closed; the browser stays warm for the next capture
+        context.close()
     
     if m3u8_urls:
         # Return the first M3U8 URL (usually the master playlist)
-        return m3u8_urls[0]
+        return m3u8_urls[0], cookies, referer
     return None
 
 
-def capture_with_selenium(url: str, wait_time: int = 10) -> Optional[str]:
-    """Capture M3U8 URL using Selenium (fallback method)"""
+def _load_and_play_selenium(driver, url: str):
+    """Load the page and try to start playback (runs in a worker thread)"""
+    print(f"Loading page: {url}")
+    driver.get(url)
+    
+    # Try to find and click play button as soon as the player has mounted it
+    try:
+        play_button = WebDriverWait(driver, 2).until(
+            EC.element_to_be_clickable((By.CSS_SELECTOR, PLAY_BUTTON_SELECTOR))
+        )
+        play_button.click()
+        print("Clicked play button")
+    except Exception as e:
+        print(f"Could not find/click play button: {e}")
+
+
+async def _listen_with_selenium(driver, url: str, wait_time: int, m3u8_urls: list):
+    """Collect M3U8 URLs from CDP Network.responseReceived events"""
+    async with driver.bidi_connection() as connection:
+        session, devtools = connection.session, connection.devtools
+        await session.execute(devtools.network.enable())
+        responses = session.listen(devtools.network.ResponseReceived, buffer_size=1000)
+        
+        async with trio.open_nursery() as nursery:
+            async def watch_responses():
+                async for event in responses:
+                    response_url = event.response.url
+                    if '.m3u8' in response_url:
+                        m3u8_urls.append(response_url)
+                        print(f"Found M3U8 URL: {response_url}")
+                        nursery.cancel_scope.cancel()
+                        return
+            
+            nursery.start_soon(watch_responses)
+            await trio.to_thread.run_sync(_load_and_play_selenium, driver, url)
+            print(f"Capturing network requests for {wait_time} seconds...")
+            await trio.sleep(wait_time)
+            nursery.cancel_scope.cancel()
+
+
+def capture_with_selenium(url: str, wait_time: int = 10, headless: bool = True) -> Optional[CaptureResult]:
+    """Capture M3U8 URL using Selenium (fallback method)
+    
+    Uses the same memory-saving BROWSER_ARGS as the Playwright path.
+    """
     m3u8_urls = []
     
     chrome_options = Options()
-    chrome_options.add_argument('--enable-logging')
-    chrome_options.add_argument('--v=1')
-    chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    if headless:
+        chrome_options.add_argument('--headless=new')
+    for arg in BROWSER_ARGS:
+        chrome_options.add_argument(arg)
+    # Skip image downloads; Selenium has no per-request interception
+    chrome_options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
     
     print("Launching browser with Selenium...")
     driver = webdriver.Chrome(options=chrome_options)
     
     try:
-        print(f"Loading page: {url}")
-        driver.get(url)
-        
-        # Wait a bit for page to load
-        time.sleep(2)
-        
-        # Try to find and click play button
-        try:
-            play_selectors = [
-                'button[aria-label*="Play"]',
-                'button[aria-label*="play"]',
-                '.play-button',
-                '.vjs-big-play-button',
-            ]
-            
-            for selector in play_selectors:
-                try:
-                    play_button = driver.find_element(By.CSS_SELECTOR, selector)
-                    if play_button:
-                        play_button.click()
-                        print("Clicked play button")
-                        break
-                except:
-                    continue
-        except Exception as e:
-            print(f"Could not find/click play button: {e}")
-        
-        # Get performance logs to find M3U8 URLs
-        print(f"Capturing network requests for {wait_time} seconds...")
-        start_time = time.time()
-        while time.time() - start_time < wait_time:
-            logs = driver.get_log('performance')
-            for log in logs:
-                message = log.get('message', '')
-                if '.m3u8' in message:
-                    # Extract URL from log message
-                    import json
-                    try:
-                        log_data = json.loads(message)
-                        if 'message' in log_data:
-                            method = log_data['message'].get('method', '')
-                            params = log_data['message'].get('params', {})
-                            if method == 'Network.responseReceived':
-                                response_url = params.get('response', {}).get('url', '')
-                                if '.m3u8' in response_url and response_url not in m3u8_urls:
-                                    m3u8_urls.append(response_url)
-                                    print(f"Found M3U8 URL: {response_url}")
-                            elif 'request' in params:
-                                request_url = params['request'].get('url', '')
-                                if '.m3u8' in request_url and request_url not in m3u8_urls:
-                                    m3u8_urls.append(request_url)
-                                    print(f"Found M3U8 URL: {request_url}")
-                    except:
-                        pass
-            time.sleep(0.5)
-        
+        # Network events are pushed over the DevTools websocket, so there is
+        # no performance log to poll and parse
+        trio.run(_listen_with_selenium, driver, url, wait_time, m3u8_urls)
+        cookies = driver.get_cookies()
+        referer = driver.current_url
     finally:
         driver.quit()
     
     if m3u8_urls:
-        return m3u8_urls[0]
+        return m3u8_urls[0], cookies, referer
     return None
 
 
-def capture_m3u8_url(url: str, wait_time: int = 15, debug: bool = False) -> Optional[str]:
+def capture_m3u8_session(url: str, wait_time: int = 15, debug: bool = False,
+                         headless: bool = True) -> Optional[CaptureResult]:
     """
-    Capture M3U8 URL from a Mediaspace page using browser automation.
-    This function can be imported and used programmatically.
+    Capture the M3U8 URL together with the browser session that loaded it.
     
     Args:
         url: The Mediaspace page URL
         wait_time: How long to wait for M3U8 URLs to appear (seconds)
         debug: Enable debug output
+        headless: Run the browser without a window (pass False to watch it)
     
     Returns:
-        The M3U8 URL if found, None otherwise
+        (m3u8_url, cookies, referer) if found, None otherwise
     """
-    m3u8_url = None
+    result = None
     
     # Try Playwright first (better for network capture)
     if PLAYWRIGHT_AVAILABLE:
         if debug:
             print("Using Playwright to capture M3U8 URL...")
         try:
-            m3u8_url = capture_with_playwright(url, wait_time)
-            if m3u8_url:
-                return m3u8_url
+            result = capture_with_playwright(url, wait_time, headless)
+            if result:
+                return result
         except Exception as e:
             if debug:
                 print(f"Playwright failed: {e}")
-            m3u8_url = None
+            result = None
     
     # Fallback to Selenium
-    if not m3u8_url and SELENIUM_AVAILABLE:
+    if not result and SELENIUM_AVAILABLE:
         if debug:
             print("Trying Selenium...")
         try:
-            m3u8_url = capture_with_selenium(url, wait_time)
-            if m3u8_url:
-                return m3u8_url
+            result = capture_with_selenium(url, wait_time, headless)
+            if result:
+                return result
         except Exception as e:
             if debug:
                 print(f"Selenium failed: {e}")
-            m3u8_url = None
+            result = None
     
-    if not m3u8_url:
+    if not result:
         if debug:
             if not PLAYWRIGHT_AVAILABLE and not SELENIUM_AVAILABLE:
                 print("Browser automation not available.")
                 print("Install browser automation libraries:")
                 print("  pip install playwright selenium")
                 print("  playwright install chromium")
+            elif headless:
+                print("Nothing captured in headless mode; retry with --show-browser to watch the page.")
     
-    return m3u8_url
+    return result
+
+
+def capture_m3u8_url(url: str, wait_time: int = 15, debug: bool = False,
+                     headless: bool = True) -> Optional[str]:
+    """
+    Capture M3U8 URL from a Mediaspace page using browser automation.
+    This function can be imported and used programmatically.
+    
+    Args:
+        url: The Mediaspace page URL
+        wait_time: How long to wait for M3U8 URLs to appear (seconds)
+        debug: Enable debug output
+        headless: Run the browser without a window (pass False to watch it)
+    
+    Returns:
+        The M3U8 URL if found, None otherwise
+    """
+    result = capture_m3u8_session(url, wait_time, debug, headless)
+    return result[0] if result else None
 
 
 def main():
-    if len(sys.argv) < 2:
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    show_browser = '--show-browser' in sys.argv[1:]
+    
+    if not args:
         print("M3U8 URL Capture Tool")
         print("\nUsage:")
-        print(f"  python {sys.argv[0]} <mediaspace_url>")
+        print(f"  python {sys.argv[0]} <mediaspace_url> [--show-browser]")
         print("\nThis tool will:")
         print("  1. Open the page in a browser")
         print("  2. Try to start video playback")
         print("  3. Capture M3U8 URLs from network requests")
         print("  4. Output the M3U8 URL for use with mediaspace_downloader.py")
+        print("\nThe browser runs headless unless --show-browser is given.")
         sys.exit(1)
     
-    url = sys.argv[1]
+    url = args[0]
     
     print("=" * 60)
     print("M3U8 URL Capture Tool")
     print("=" * 60)
     print(f"URL: {url}\n")
     
-    m3u8_url = capture_m3u8_url(url, wait_time=15, debug=True)
+    m3u8_url = capture_m3u8_url(url, wait_time=15, debug=True, headless=not show_browser)
     
     if not m3u8_url:
         print("\n" + "=" * 60)
@@ -12,16 +12,11 @@ if ! command -v python3 &> /dev/null; then
     exit 1
 fi
 
-# Check if ffmpeg is available
+# ffmpeg is only needed for MP4 (or other remuxed) output
 if ! command -v ffmpeg &> /dev/null; then
-    echo "Warning: ffmpeg is not installed or not in PATH"
-    echo "The downloader requires ffmpeg to convert videos."
-    echo "Install it with: brew install ffmpeg"
+    echo "Note: ffmpeg is not installed, so videos will be saved as .ts files."
+    echo "Install it with 'brew install ffmpeg' to get MP4 output."
     echo ""
-    read -p "Continue anyway? (y/N): " continue_anyway
-    if [[ ! "$continue_anyway" =~ ^[yY] ]]; then
-        exit 1
-    fi
 fi
 
 # Get URL from user
@@ -1,85 +1,355 @@
 #!/usr/bin/env python3
 """
 Mediaspace Video Downloader
-Downloads TS segments from Mediaspace and converts them to MP4
+Downloads the TS segments of a Mediaspace video into a single .ts file,
+or remuxes them to MP4 (or another container) with ffmpeg
 """
 
 import os
 import sys
 import re
+import asyncio
+import json
+import socket
+import threading
 import requests
 import subprocess
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from requests.cookies import get_cookie_header
+from urllib3.util.retry import Retry
 from urllib.parse import urljoin, urlparse
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
 import tempfile
 import shutil
 
 # Try to import browser capture function
 try:
-    from capture_m3u8 import capture_m3u8_url
+    from capture_m3u8 import capture_m3u8_session, close_browser_pool
     CAPTURE_AVAILABLE = True
 except ImportError:
     CAPTURE_AVAILABLE = False
 
+# aiohttp drives segment downloads from a single event loop when installed
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+# pyahocorasick finds page keywords in one C-level pass when installed
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Number of segments fetched concurrently; the connection pool is sized so
+# every worker can keep its own keep-alive connection
+SEGMENT_WORKERS = 16
+POOL_SIZE = 64
+# In-flight segment requests when downloading with aiohttp
+ASYNC_CONCURRENCY = 32
+# Read size used when streaming segment bodies to disk
+CHUNK_SIZE = 256 * 1024
+# Timeout for the serial retry of segments that failed in the parallel pass
+RETRY_TIMEOUT = 90
+# Segments larger than this are streamed to disk instead of read in one piece
+STREAM_THRESHOLD = 8 * 1024 * 1024
+# Maximum number of segments held in memory while streaming into ffmpeg
+STREAM_WINDOW = 32
+# Seconds between redraws of the segment progress line
+PROGRESS_INTERVAL = 0.1
+# Output containers ffmpeg remuxes the TS stream into ('ts' needs no ffmpeg)
+REMUX_CONTAINERS = ('mp4', 'mkv', 'mov', 'm4v')
+# os.sendfile only accepts a regular file as destination on Linux
+SENDFILE_AVAILABLE = hasattr(os, 'sendfile') and sys.platform.startswith('linux')
+# Deepest chain of master -> variant playlists followed by parse_m3u8
+MAX_PLAYLIST_DEPTH = 3
+# Remembers which Kaltura manifest template answered for each (domain, partner)
+# so repeat runs against the same Mediaspace skip the probing round
+TEMPLATE_CACHE_FILE = Path.home() / '.cache' / 'mediaspace_downloader' / 'kaltura_templates.json'
+
+# Single-pass scan over the raw page bytes, one named group per kind of hit:
+# absolute M3U8 URLs, (possibly relative) ones assigned to url/src attributes
+# and JS properties, and Kaltura entry IDs
+_PAGE_SCAN_RE = re.compile(
+    rb'(?P<m3u8>https?://[^\s"\'<>]+\.m3u8[^\s"\'<>]*)'
+    rb'|(?:url|src)["\']?\s*[:=]\s*["\'](?P<m3u8_assigned>[^"\'\s<>]+\.m3u8[^"\'<>]*)["\']'
+    rb'|(?:entryId|entry_id|kentryid)["\']?\s*[:=]\s*["\'](?P<entry>[A-Za-z0-9_]{6,})["\']',
+    re.IGNORECASE
+)
+
+# Characters that end a URL in page source, matching the classes in _PAGE_SCAN_RE
+# (an assigned URL may run on past whitespace up to its closing quote)
+_URL_DELIMITERS = b' \t\n\r\f\v"\'<>'
+_URL_CLOSE_RE = re.compile(rb'["\'<>]')
+# Room before a URL for a url=/src: assignment, and after an entry keyword for its value
+_ASSIGN_LOOKBACK = 64
+_ENTRY_LOOKAHEAD = 512
+
+
+def _build_automaton(keywords):
+    """Build an Aho-Corasick automaton mapping each keyword to its kind of hit"""
+    automaton = ahocorasick.Automaton()
+    for keyword, kind in keywords:
+        automaton.add_word(keyword, kind)
+    automaton.make_automaton()
+    return automaton
+
+
+if AHOCORASICK_AVAILABLE:
+    # Matched against the lowercased page, mirroring the case-insensitive regex
+    # ('entryid' also covers kentryid and kalturaEntryId)
+    _PAGE_ANCHORS = _build_automaton((
+        ('.m3u8', 'm3u8'), ('entryid', 'entry'), ('entry_id', 'entry'),
+    ))
+
+
+def _url_start(body: bytes, pos: int) -> int:
+    """Offset just past the last URL delimiter before pos, however long the URL is"""
+    step = 2048
+    low = pos
+    while low > 0:
+        low = max(0, low - step)
+        start = max(body.rfind(bytes([c]), low, pos) for c in _URL_DELIMITERS)
+        if start >= 0:
+            return start + 1
+        step *= 2
+    return 0
+
+
+def _scan_page(body: bytes) -> Iterator[Tuple[str, bytes]]:
+    """Yield ('m3u8', url) and ('entry', entry_id) hits from a page, in page order"""
+    if not AHOCORASICK_AVAILABLE:
+        for match in _PAGE_SCAN_RE.finditer(body):
+            kind = match.lastgroup
+            yield ('entry' if kind == 'entry' else 'm3u8'), match.group(kind)
+        return
+    
+    # latin-1 maps bytes 1:1 to characters and bytes.lower() only folds ASCII,
+    # so automaton offsets are byte offsets into body
+    # Like finditer, never yield a match overlapping the previous one
+    last_end = 0
+    for end, kind in _PAGE_ANCHORS.iter(body.lower().decode('latin-1')):
+        if end < last_end:
+            continue
+        if kind == 'm3u8':
+            # Run the pattern over the whole URL around the hit, plus the
+            # assignment before it and the closing quote after it
+            window_start = max(0, _url_start(body, end) - 1 - _ASSIGN_LOOKBACK)
+            delimiter = _URL_CLOSE_RE.search(body, end)
+            window_end = delimiter.end() if delimiter else len(body)
+        else:
+            # The keyword starts the match (possibly as kentryid)
+            window_start = max(0, end + 1 - len('kentryid'))
+            window_end = end + _ENTRY_LOOKAHEAD
+        for match in _PAGE_SCAN_RE.finditer(body, max(window_start, last_end), window_end):
+            if match.start() <= end < match.end():
+                last_end = match.end()
+                group = match.lastgroup
+                yield ('entry' if group == 'entry' else 'm3u8'), match.group(group)
+
+
+# Common Mediaspace URL patterns carrying a Kaltura entry ID
+_KALTURA_URL_PATTERNS = tuple(re.compile(p, re.IGNORECASE) for p in (
+    r'/media/[^/]+/([^/?&#]+)',  # /media/category/entry_id
+    r'/media/([^/?&#]+)',        # /media/entry_id
+    r'/id/([^/?&#]+)',           # /id/entry_id
+    r'/entry/([^/?&#]+)',        # /entry/entry_id
+    r'/video/([^/?&#]+)',        # /video/entry_id
+    r'entryId=([^&]+)',          # ?entryId=...
+    r'entry_id=([^&]+)',         # ?entry_id=...
+))
+_PARTNER_ID_RE = re.compile(r'/p/(\d+)')
+# A URL that names an .m3u8 playlist (possibly followed by a query or more path)
+_M3U8_URL_RE = re.compile(r'\.m3u8(?:$|[?#/])', re.IGNORECASE)
+
+# Common Kaltura API patterns for M3U8, filled in with str.format
+_KALTURA_MANIFEST_TEMPLATES = (
+    "https://{domain}/p/{partner}/sp/{partner}00/playManifest/entryId/{entry}/format/applehttp/protocol/https/a.m3u8",
+    "https://{domain}/p/{partner}/sp/0/playManifest/entryId/{entry}/format/applehttp/protocol/https/a.m3u8",
+    "https://{domain}/p/0/sp/0/playManifest/entryId/{entry}/format/applehttp/protocol/https/a.m3u8",
+    "https://cdnapisec.kaltura.com/p/{partner}/sp/{partner}00/playManifest/entryId/{entry}/format/applehttp/protocol/https/a.m3u8",
+    "https://cdnapisec.kaltura.com/p/0/sp/0/playManifest/entryId/{entry}/format/applehttp/protocol/https/a.m3u8",
+    "https://{domain}/p/{partner}/sp/{partner}00/playManifest/entryId/{entry}/format/url/protocol/https/a.m3u8",
+)
+
+# Patterns used to find a Kaltura entry ID in page HTML (scanned as raw bytes)
+_KALTURA_HTML_PATTERNS = tuple(re.compile(p, re.IGNORECASE) for p in (
+    rb'entryId["\']?\s*[:=]\s*["\']([^"\']+)["\']',
+    rb'"entry_id"\s*:\s*"([^"]+)"',
+    rb'entry_id["\']?\s*[:=]\s*["\']([^"\']+)["\']',
+    rb'kentryid["\']?\s*[:=]\s*["\']([^"\']+)["\']',
+    rb'entryId\s*:\s*["\']([^"\']+)["\']',
+    rb'entryId\s*:\s*([^,\s}]+)',
+    rb'kalturaEntryId["\']?\s*[:=]\s*["\']([^"\']+)["\']',
+))
+
+# Playlist parsing patterns
+# BANDWIDTH and RESOLUTION from one #EXT-X-STREAM-INF line in a single match,
+# in either order and without mistaking AVERAGE-BANDWIDTH for BANDWIDTH
+_STREAM_INF_RE = re.compile(r'(?=(?:.*?[:,]\s*BANDWIDTH=(\d+))?)(?=(?:.*?RESOLUTION=(\d+x\d+))?)')
+# Segment URLs: a .ts file (query string allowed), a segment/chunk path, or a
+# numbered seg_/chunk_ name anywhere in the line
+_IS_SEGMENT_RE = re.compile(r'\.ts(?:\?|$)|/segment|/chunk|/seg-|seg_\d|chunk_\d', re.IGNORECASE)
+
+
+class _ProgressReporter:
+    """Single progress line for parallel downloads: workers only bump a counter
+    and one background thread redraws it"""
+    
+    def __init__(self, total: int, interval: float = PROGRESS_INTERVAL):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+    
+    def __enter__(self):
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._draw()
+        sys.stdout.write('\n')
+        sys.stdout.flush()
+    
+    def advance(self):
+        with self._lock:
+            self.done += 1
+    
+    def log(self, message: str):
+        """Print a full line above the progress line"""
+        with self._lock:
+            sys.stdout.write(f"\r{message}\n")
+            sys.stdout.flush()
+    
+    def _draw(self):
+        with self._lock:
+            sys.stdout.write(f"\r[{self.done}/{self.total}]")
+            sys.stdout.flush()
+    
+    def _run(self):
+        drawn = None
+        while not self._stop.wait(self.interval):
+            # Only redraw when something finished, to keep redirected output small
+            if self.done != drawn:
+                drawn = self.done
+                self._draw()
+
 
 class MediaspaceDownloader:
-    def __init__(self, output_dir: str = "downloads"):
+    def __init__(self, output_dir: str = "downloads", max_workers: Optional[int] = None,
+                 keep_browser: bool = False):
         self.output_dir = Path(output_dir)
+        # Concurrent segment fetches; lower max_workers on congested links. Left
+        # unset, threads and aiohttp each use their own default.
+        self.max_workers = max_workers or SEGMENT_WORKERS
+        self.async_concurrency = max_workers or ASYNC_CONCURRENCY
+        # Keep the capture browser warm between downloads (batch use); by default it
+        # is shut down right after a capture so it doesn't sit in memory meanwhile
+        self.keep_browser = keep_browser
         self.output_dir.mkdir(exist_ok=True)
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
+        # Share pooled keep-alive connections across download threads and
+        # retry transient server errors from the CDN edges
+        retry = Retry(total=5, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=frozenset(['GET', 'HEAD']))
+        pool_size = max(POOL_SIZE, self.max_workers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # Pages fetched while looking for the playlist, shared by the extractors
+        self._page_cache = {}
+        self._template_cache = self._load_template_cache()
+        # Progress line of the segment batch currently downloading, if any
+        self._progress = None
+    
+    def apply_browser_state(self, cookies: List[dict], referer: str):
+        """Reuse cookies and Referer from a browser capture so signed CDN URLs keep working"""
+        for cookie in cookies:
+            self.session.cookies.set(cookie['name'], cookie['value'],
+                                     domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+        self.session.headers['Referer'] = referer
+    
+    def prewarm_dns(self, url: str):
+        """Resolve a host once so the parallel segment downloads don't all race the resolver"""
+        parsed = urlparse(url)
+        if not parsed.hostname:
+            return
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        try:
+            socket.getaddrinfo(parsed.hostname, port, type=socket.SOCK_STREAM)
+        except OSError:
+            pass
+    
+    def _get_page(self, url: str) -> requests.Response:
+        """Fetch a page once and reuse the response for later lookups of the same URL"""
+        response = self._page_cache.get(url)
+        if response is None:
+            response = self.session.get(url, timeout=10)
+            response.raise_for_status()
+            self._page_cache[url] = response
+        return response
+    
+    def _is_playlist_url(self, url: str) -> bool:
+        """Tell whether a URL points straight at an M3U8 playlist"""
+        if _M3U8_URL_RE.search(url):
+            return True
+        # Playlists served without the extension still announce themselves
+        try:
+            response = self.session.head(url, timeout=5, allow_redirects=True)
+            return 'mpegurl' in response.headers.get('Content-Type', '').lower()
+        except requests.RequestException:
+            return False
     
     def get_m3u8_url(self, url: str, debug: bool = False) -> Optional[str]:
         """Extract M3U8 playlist URL from Mediaspace page"""
         try:
             if debug:
                 print(f"Fetching page: {url}")
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
+            response = self._get_page(url)
             
+            body = response.content
             if debug:
-                print(f"Page loaded, size: {len(response.text)} bytes")
-            
-            # Look for M3U8 URLs in the page (various patterns)
-            m3u8_patterns = [
-                r'"(https?://[^"]+\.m3u8[^"]*)"',
-                r"'(https?://[^']+\.m3u8[^']*)'",
-                r'(https?://[^\s<>"]+\.m3u8[^\s<>"]*)',
-                r'url["\']?\s*[:=]\s*["\']([^"\']+\.m3u8[^"\']*)["\']',
-                r'src["\']?\s*[:=]\s*["\']([^"\']+\.m3u8[^"\']*)["\']',
-            ]
+                print(f"Page loaded, size: {len(body)} bytes")
             
-            for pattern in m3u8_patterns:
-                matches = re.findall(pattern, response.text, re.IGNORECASE)
-                if matches:
+            # Look for M3U8 URLs in one pass, preferring URLs that look like actual
+            # playlists, and note the first entry ID on the way in case there are none
+            first_url = None
+            entry_bytes = None
+            for kind, value in _scan_page(body):
+                if kind == 'entry':
+                    entry_bytes = entry_bytes or value
+                    continue
+                m3u8_url = urljoin(url, value.decode('utf-8', 'replace'))
+                if 'playlist' in m3u8_url.lower() or 'index' in m3u8_url.lower():
                     if debug:
-                        print(f"Found {len(matches)} M3U8 URL(s) with pattern")
-                    # Prefer URLs that look like actual playlists
-                    for match in matches:
-                        if 'playlist' in match.lower() or 'index' in match.lower():
-                            if debug:
-                                print(f"Selected playlist URL: {match}")
-                            return match
-                    if debug:
-                        print(f"Selected first M3U8 URL: {matches[0]}")
-                    return matches[0]
-            
-            # Check for video source tags
-            video_src_pattern = r'<source[^>]+src=["\']([^"\']+)["\']'
-            matches = re.findall(video_src_pattern, response.text, re.IGNORECASE)
-            for match in matches:
-                if '.m3u8' in match:
-                    if debug:
-                        print(f"Found M3U8 in video source: {match}")
-                    return urljoin(url, match)
+                        print(f"Selected playlist URL: {m3u8_url}")
+                    return m3u8_url
+                if first_url is None:
+                    first_url = m3u8_url
+            if first_url:
+                if debug:
+                    print(f"Selected first M3U8 URL: {first_url}")
+                return first_url
             
             # Try to find Kaltura entry ID and construct API URL
             if debug:
                 print("Trying to extract Kaltura entry ID...")
-            entry_id = self._extract_kaltura_entry_id(response.text, url)
+            entry_id = self._extract_kaltura_entry_id_from_url(url)
+            if not entry_id and entry_bytes:
+                entry_id = entry_bytes.decode('ascii')
             if entry_id:
                 if debug:
                     print(f"Found entry ID: {entry_id}")
@@ -92,24 +362,6 @@ class MediaspaceDownloader:
                 if debug:
                     print("Could not extract entry ID from page")
             
-            # Look for JSON data with video URLs
-            json_patterns = [
-                r'kalturaPlayerOptions\s*=\s*({[^}]+})',
-                r'entryId["\']?\s*[:=]\s*["\']([^"\']+)["\']',
-                r'"entry_id"\s*:\s*"([^"]+)"',
-            ]
-            
-            for pattern in json_patterns:
-                matches = re.findall(pattern, response.text, re.IGNORECASE)
-                if matches:
-                    entry_id = matches[0] if isinstance(matches[0], str) else None
-                    if entry_id and len(entry_id) > 5:  # Valid entry ID
-                        if debug:
-                            print(f"Found entry ID in JSON: {entry_id}")
-                        m3u8_url = self._try_kaltura_api(entry_id, url)
-                        if m3u8_url:
-                            return m3u8_url
-            
             if debug:
                 print("No M3U8 URL found in page source")
                 print("\nNote: M3U8 URLs are often loaded dynamically when video starts playing.")
@@ -121,7 +373,7 @@ class MediaspaceDownloader:
             print(f"Error fetching page: {e}")
             return None
     
-    def extract_kaltura_link(self, url: str, debug: bool = False) -> Optional[str]:
+    def extract_kaltura_link(self, url: str, debug: bool = False, show_browser: bool = False) -> Optional[str]:
         """Extract Kaltura M3U8 link from a Mediaspace URL"""
         if debug:
             print(f"Extracting Kaltura link from: {url}")
@@ -139,11 +391,10 @@ class MediaspaceDownloader:
         try:
             if debug:
                 print("Fetching page to extract Kaltura information...")
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
+            response = self._get_page(url)
             
             # Extract entry ID from HTML
-            entry_id = self._extract_kaltura_entry_id(response.text, url)
+            entry_id = self._extract_kaltura_entry_id(response.content)
             if entry_id:
                 if debug:
                     print(f"Found entry ID from HTML: {entry_id}")
@@ -157,14 +408,20 @@ class MediaspaceDownloader:
         # If simple extraction failed, try using browser automation from capture_m3u8.py
         if CAPTURE_AVAILABLE:
             print("\nSimple extraction failed, trying browser automation to capture M3U8 URL...")
-            print("A browser window will open to capture the video URL.")
+            if show_browser:
+                print("A browser window will open to capture the video URL.")
             try:
-                browser_url = capture_m3u8_url(url, wait_time=15, debug=debug)
-                if browser_url:
+                captured = capture_m3u8_session(url, wait_time=15, debug=debug, headless=not show_browser)
+                if captured:
+                    browser_url, cookies, referer = captured
+                    self.apply_browser_state(cookies, referer)
                     print(f"✓ Captured M3U8 URL using browser: {browser_url}")
                     return browser_url
             except Exception as e:
                 print(f"Browser capture failed: {e}")
+            finally:
+                if not self.keep_browser:
+                    close_browser_pool()
         else:
             print("\nBrowser automation not available. Install dependencies:")
             print("  pip install playwright selenium")
@@ -174,24 +431,8 @@ class MediaspaceDownloader:
     
     def _extract_kaltura_entry_id_from_url(self, url: str) -> Optional[str]:
         """Extract Kaltura entry ID directly from URL patterns"""
-        # Common Mediaspace URL patterns:
-        # /media/ENTRY_ID
-        # /media/CATEGORY/ENTRY_ID
-        # /id/ENTRY_ID
-        # /entry/ENTRY_ID
-        # /video/ENTRY_ID
-        patterns = [
-            r'/media/[^/]+/([^/?&#]+)',  # /media/category/entry_id
-            r'/media/([^/?&#]+)',        # /media/entry_id
-            r'/id/([^/?&#]+)',           # /id/entry_id
-            r'/entry/([^/?&#]+)',        # /entry/entry_id
-            r'/video/([^/?&#]+)',        # /video/entry_id
-            r'entryId=([^&]+)',          # ?entryId=...
-            r'entry_id=([^&]+)',         # ?entry_id=...
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, url, re.IGNORECASE)
+        for pattern in _KALTURA_URL_PATTERNS:
+            match = pattern.search(url)
             if match:
                 entry_id = match.group(1)
                 # Clean up URL encoding
@@ -204,67 +445,94 @@ class MediaspaceDownloader:
         
         return None
     
-    def _extract_kaltura_entry_id(self, html: str, url: str) -> Optional[str]:
-        """Extract Kaltura entry ID from URL or HTML"""
-        # Try to extract from URL first (common pattern: /media/ENTRY_ID)
-        entry_id = self._extract_kaltura_entry_id_from_url(url)
-        if entry_id:
-            return entry_id
-        
-        # Try to find in HTML
-        patterns = [
-            r'entryId["\']?\s*[:=]\s*["\']([^"\']+)["\']',
-            r'"entry_id"\s*:\s*"([^"]+)"',
-            r'entry_id["\']?\s*[:=]\s*["\']([^"\']+)["\']',
-            r'kentryid["\']?\s*[:=]\s*["\']([^"\']+)["\']',
-            r'entryId\s*:\s*["\']([^"\']+)["\']',
-            r'entryId\s*:\s*([^,\s}]+)',
-            r'kalturaEntryId["\']?\s*[:=]\s*["\']([^"\']+)["\']',
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, html, re.IGNORECASE)
-            if matches:
-                entry_id = matches[0].strip()
+    def _extract_kaltura_entry_id(self, html: bytes) -> Optional[str]:
+        """Extract Kaltura entry ID from page HTML (the URL is checked separately)"""
+        for pattern in _KALTURA_HTML_PATTERNS:
+            match = pattern.search(html)
+            if match:
+                entry_id = match.group(1).decode('utf-8', 'replace').strip()
                 if entry_id and len(entry_id) > 3:
                     return entry_id
         
         return None
     
+    def _load_template_cache(self) -> dict:
+        """Load the manifest templates that worked on earlier runs"""
+        try:
+            with open(TEMPLATE_CACHE_FILE, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            return cache if isinstance(cache, dict) else {}
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_template_cache(self):
+        """Persist the manifest template cache; a read-only home just skips it"""
+        try:
+            TEMPLATE_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            with open(TEMPLATE_CACHE_FILE, 'w', encoding='utf-8') as f:
+                json.dump(self._template_cache, f, indent=2)
+        except OSError:
+            pass
+    
+    def _probe_manifest(self, api_url: str) -> bool:
+        """HEAD a candidate manifest URL and check that it serves a playlist"""
+        response = self.session.head(api_url, timeout=5, allow_redirects=True)
+        if response.status_code != 200:
+            return False
+        # Verify it's actually an M3U8 file
+        content_type = response.headers.get('Content-Type', '')
+        if 'm3u8' in content_type or 'application/vnd.apple.mpegurl' in content_type:
+            return True
+        # Also accept it if the URL ends with .m3u8
+        return api_url.endswith('.m3u8')
+    
     def _construct_kaltura_m3u8_url(self, entry_id: str, base_url: str) -> Optional[str]:
         """Construct Kaltura M3U8 URL from entry ID"""
         base_domain = urlparse(base_url).netloc
         
         # Try to extract partner ID from base URL or use common defaults
         partner_id = "0"  # Default partner ID
-        partner_match = re.search(r'/p/(\d+)', base_url)
+        partner_match = _PARTNER_ID_RE.search(base_url)
         if partner_match:
             partner_id = partner_match.group(1)
         
-        # Common Kaltura API patterns for M3U8
-        api_patterns = [
-            f"https://{base_domain}/p/{partner_id}/sp/{partner_id}00/playManifest/entryId/{entry_id}/format/applehttp/protocol/https/a.m3u8",
-            f"https://{base_domain}/p/{partner_id}/sp/0/playManifest/entryId/{entry_id}/format/applehttp/protocol/https/a.m3u8",
-            f"https://{base_domain}/p/0/sp/0/playManifest/entryId/{entry_id}/format/applehttp/protocol/https/a.m3u8",
-            f"https://cdnapisec.kaltura.com/p/{partner_id}/sp/{partner_id}00/playManifest/entryId/{entry_id}/format/applehttp/protocol/https/a.m3u8",
-            f"https://cdnapisec.kaltura.com/p/0/sp/0/playManifest/entryId/{entry_id}/format/applehttp/protocol/https/a.m3u8",
-            f"https://{base_domain}/p/{partner_id}/sp/{partner_id}00/playManifest/entryId/{entry_id}/format/url/protocol/https/a.m3u8",
-        ]
+        fields = {'domain': base_domain, 'partner': partner_id, 'entry': entry_id}
+        cache_key = f"{base_domain}/{partner_id}"
         
-        # Test each pattern to see which one works
-        for api_url in api_patterns:
+        # The template that worked last time almost always works again
+        cached_template = self._template_cache.get(cache_key)
+        if cached_template in _KALTURA_MANIFEST_TEMPLATES:
+            api_url = cached_template.format(**fields)
             try:
-                response = self.session.head(api_url, timeout=5, allow_redirects=True)
-                if response.status_code == 200:
-                    # Verify it's actually an M3U8 file
-                    content_type = response.headers.get('Content-Type', '')
-                    if 'm3u8' in content_type or 'application/vnd.apple.mpegurl' in content_type:
-                        return api_url
-                    # Also check if the URL ends with .m3u8
-                    if api_url.endswith('.m3u8'):
-                        return api_url
-            except:
-                continue
+                if self._probe_manifest(api_url):
+                    return api_url
+            except Exception:
+                pass
+        
+        # Probe every candidate at once so discovery costs one round trip,
+        # and take the first one that answers
+        executor = ThreadPoolExecutor(max_workers=len(_KALTURA_MANIFEST_TEMPLATES))
+        futures = {
+            executor.submit(self._probe_manifest, template.format(**fields)): template
+            for template in _KALTURA_MANIFEST_TEMPLATES
+        }
+        try:
+            for future in as_completed(futures):
+                try:
+                    if not future.result():
+                        continue
+                except Exception:
+                    continue
+                template = futures[future]
+                if self._template_cache.get(cache_key) != template:
+                    self._template_cache[cache_key] = template
+                    self._save_template_cache()
+                return template.format(**fields)
+        finally:
+            # Don't wait on the slower probes once one has answered
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
         
         return None
     
@@ -272,126 +540,262 @@ class MediaspaceDownloader:
         """Try to construct Kaltura API URL to get M3U8 (legacy method, use _construct_kaltura_m3u8_url instead)"""
         return self._construct_kaltura_m3u8_url(entry_id, base_url)
     
-    def parse_m3u8(self, m3u8_url: str) -> List[str]:
-        """Parse M3U8 playlist and return list of TS segment URLs"""
-        try:
-            response = self.session.get(m3u8_url, timeout=10)
+    def _read_playlist(self, m3u8_url: str) -> Tuple[List[Tuple[int, Optional[str], str]], List[str]]:
+        """Fetch a playlist and return its variant streams and its TS segment URLs"""
+        base_url = '/'.join(m3u8_url.split('/')[:-1]) + '/'
+        
+        # Single pass: collect variant streams (master playlist) and TS segments
+        # (media playlist) together, pairing each #EXT-X-STREAM-INF with the
+        # line that follows it. Lines are read as they arrive instead of
+        # materialising the whole playlist and a list of its lines.
+        stream_info = []
+        ts_segments = []
+        pending_info = None
+        with self.session.get(m3u8_url, timeout=10, stream=True) as response:
             response.raise_for_status()
-            
-            base_url = '/'.join(m3u8_url.split('/')[:-1]) + '/'
-            playlist_text = response.text
-            
-            # Check if this is a master playlist (contains #EXT-X-STREAM-INF)
-            if '#EXT-X-STREAM-INF' in playlist_text:
-                print("Found master playlist, selecting best quality...")
-                # Find all stream URLs with their quality info
-                stream_info = []
-                lines = playlist_text.split('\n')
-                for i, line in enumerate(lines):
-                    if line.startswith('#EXT-X-STREAM-INF'):
-                        # Extract bandwidth and resolution if available
-                        bandwidth = 0
-                        resolution = None
-                        if 'BANDWIDTH=' in line:
-                            bw_match = re.search(r'BANDWIDTH=(\d+)', line)
-                            if bw_match:
-                                bandwidth = int(bw_match.group(1))
-                        if 'RESOLUTION=' in line:
-                            res_match = re.search(r'RESOLUTION=(\d+x\d+)', line)
-                            if res_match:
-                                resolution = res_match.group(1)
-                        
-                        # Next line should be the stream URL
-                        if i + 1 < len(lines):
-                            stream_url = lines[i + 1].strip()
-                            if stream_url and not stream_url.startswith('#'):
-                                # Skip subtitle tracks (they have TYPE=SUBTITLES in the line)
-                                if 'TYPE=SUBTITLES' not in line and 'caption' not in stream_url.lower():
-                                    if stream_url.startswith('http'):
-                                        stream_info.append((bandwidth, resolution, stream_url))
-                                    else:
-                                        stream_info.append((bandwidth, resolution, urljoin(base_url, stream_url)))
-                
-                if stream_info:
-                    # Sort by bandwidth (highest first) and select the best quality
-                    stream_info.sort(key=lambda x: x[0], reverse=True)
-                    best_bandwidth, best_resolution, best_url = stream_info[0]
-                    print(f"Selected stream: {best_resolution or 'unknown'} @ {best_bandwidth} bps")
-                    print(f"Stream URL: {best_url}")
-                    return self.parse_m3u8(best_url)
-            
-            # Parse regular playlist for TS segments
-            ts_segments = []
-            lines = playlist_text.split('\n')
-            
-            for line in lines:
+            # Without a charset iter_lines would hand back bytes
+            response.encoding = response.encoding or 'utf-8'
+            for line in response.iter_lines(decode_unicode=True):
                 line = line.strip()
-                if line and not line.startswith('#'):
-                    # Handle various segment URL patterns
-                    # Check for .ts extension, segment/chunk in path, or segment number patterns
-                    is_segment = (
-                        line.endswith('.ts') or 
-                        '/segment' in line.lower() or 
-                        '/chunk' in line.lower() or
-                        '/seg-' in line.lower() or
-                        re.search(r'seg_\d+', line.lower()) or
-                        re.search(r'chunk_\d+', line.lower())
-                    )
-                    
-                    if is_segment:
-                        # Handle relative and absolute URLs
+                if not line:
+                    # Blank lines carry no meaning in a playlist
+                    continue
+                if line.startswith('#EXT-X-STREAM-INF'):
+                    # Skip subtitle tracks (they have TYPE=SUBTITLES in the line)
+                    # before doing any attribute parsing
+                    if 'TYPE=SUBTITLES' in line:
+                        pending_info = ()
+                    else:
+                        bandwidth, resolution = _STREAM_INF_RE.match(line).groups()
+                        pending_info = (int(bandwidth or 0), resolution)
+                elif line.startswith('#'):
+                    pending_info = None
+                elif pending_info is not None:
+                    info = pending_info
+                    pending_info = None
+                    if info and 'caption' not in line.lower():
+                        bandwidth, resolution = info
                         if line.startswith('http'):
-                            ts_segments.append(line)
+                            stream_info.append((bandwidth, resolution, line))
                         else:
-                            ts_segments.append(urljoin(base_url, line))
+                            stream_info.append((bandwidth, resolution, urljoin(base_url, line)))
+                elif _IS_SEGMENT_RE.search(line):
+                    # Handle relative and absolute URLs
+                    if line.startswith('http'):
+                        ts_segments.append(line)
+                    else:
+                        ts_segments.append(urljoin(base_url, line))
+        
+        return stream_info, ts_segments
+    
+    def parse_m3u8(self, m3u8_url: str, _seen: Optional[set] = None,
+                   _prefetched: Optional[Future] = None) -> List[str]:
+        """Parse M3U8 playlist and return list of TS segment URLs"""
+        # Guard against CDNs that hand back a master playlist (or a loop of
+        # them) instead of the variant playlist
+        _seen = _seen if _seen is not None else set()
+        if m3u8_url in _seen or len(_seen) >= MAX_PLAYLIST_DEPTH:
+            print(f"Error: Playlist nesting loop detected at {m3u8_url}")
+            return []
+        _seen.add(m3u8_url)
+        
+        try:
+            if _prefetched is not None:
+                stream_info, ts_segments = _prefetched.result()
+            else:
+                stream_info, ts_segments = self._read_playlist(m3u8_url)
+            
+            if stream_info:
+                print("Found master playlist, selecting best quality...")
+                # Sort by bandwidth (highest first) and select the best quality
+                stream_info.sort(key=lambda x: x[0], reverse=True)
+                # Fetch the runner-up alongside the best variant so a broken best
+                # variant costs no extra round trip; the best one wins whenever it works
+                candidates = stream_info[:2]
+                executor = ThreadPoolExecutor(max_workers=len(candidates))
+                futures = [executor.submit(self._read_playlist, variant_url)
+                           for _, _, variant_url in candidates]
+                try:
+                    for (bandwidth, resolution, variant_url), future in zip(candidates, futures):
+                        print(f"Selected stream: {resolution or 'unknown'} @ {bandwidth} bps")
+                        print(f"Stream URL: {variant_url}")
+                        segments = self.parse_m3u8(variant_url, set(_seen), future)
+                        if segments:
+                            return segments
+                        if future is not futures[-1]:
+                            print("Falling back to the next best stream...")
+                finally:
+                    for future in futures:
+                        future.cancel()
+                    executor.shutdown(wait=False)
+                return []
             
             return ts_segments
         except Exception as e:
             print(f"Error parsing M3U8: {e}")
             return []
     
-    def download_segment(self, url: str, output_path: Path, segment_num: int, total: int) -> bool:
+    @contextmanager
+    def _show_progress(self, total: int):
+        """Replace per-segment output with one progress line for a batch"""
+        self._progress = _ProgressReporter(total)
+        try:
+            with self._progress:
+                yield
+        finally:
+            self._progress = None
+    
+    def _segment_done(self, message: str):
+        """Count a finished segment, or print it when no progress line is shown"""
+        if self._progress:
+            self._progress.advance()
+        else:
+            print(message)
+    
+    def _log(self, message: str):
+        """Print a message without garbling the progress line"""
+        if self._progress:
+            self._progress.log(message)
+        else:
+            print(message)
+    
+    def download_segment(self, url: str, output_path: Path, segment_num: int, total: int,
+                         timeout: float = 30) -> bool:
         """Download a single TS segment"""
         try:
-            response = self.session.get(url, timeout=30, stream=True)
+            response = self.session.get(url, timeout=timeout, stream=True)
             response.raise_for_status()
             
-            with open(output_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+            # Typical segments are well under a megabyte: read them in one go
+            # and only stream the unusually large ones
+            if int(response.headers.get('Content-Length', 0)) > STREAM_THRESHOLD:
+                response.raw.decode_content = True
+                with open(output_path, 'wb') as f:
+                    shutil.copyfileobj(response.raw, f, length=CHUNK_SIZE)
+            else:
+                output_path.write_bytes(response.content)
             
-            print(f"Downloaded segment {segment_num}/{total}: {output_path.name}")
+            self._segment_done(f"Downloaded segment {segment_num}/{total}: {output_path.name}")
             return True
         except Exception as e:
-            print(f"Error downloading segment {segment_num}: {e}")
+            self._log(f"Error downloading segment {segment_num}: {e}")
             return False
     
-    def download_all_segments(self, ts_urls: List[str], temp_dir: Path) -> List[Path]:
-        """Download all TS segments to temporary directory"""
-        downloaded_files = []
+    def fetch_segment(self, url: str, segment_num: int, total: int,
+                      timeout: float = 30) -> Optional[bytes]:
+        """Download a single TS segment into memory"""
+        try:
+            response = self.session.get(url, timeout=timeout)
+            response.raise_for_status()
+            self._segment_done(f"Downloaded segment {segment_num}/{total}")
+            return response.content
+        except Exception as e:
+            self._log(f"Error downloading segment {segment_num}: {e}")
+            return None
+    
+    async def _download_all_async(self, ts_urls: List[str], temp_dir: Path) -> List[bool]:
+        """Download all TS segments concurrently on one event loop"""
+        total = len(ts_urls)
+        semaphore = asyncio.Semaphore(self.async_concurrency)
+        connector = aiohttp.TCPConnector(limit=self.async_concurrency, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(sock_connect=30, sock_read=30)
         
-        print(f"\nDownloading {len(ts_urls)} segments...")
-        for i, url in enumerate(ts_urls, 1):
-            segment_name = f"segment_{i:05d}.ts"
-            segment_path = temp_dir / segment_name
-            downloaded_files.append(segment_path)
+        # Carry over headers and cookies (e.g. from a browser capture). Cookies are
+        # picked per URL from the requests jar so each only goes to its own domain.
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers=dict(self.session.headers),
+                                         cookie_jar=aiohttp.DummyCookieJar(),
+                                         # Same proxy/netrc environment as the requests session
+                                         trust_env=self.session.trust_env) as session:
+            async def download(segment_num: int, url: str) -> bool:
+                output_path = temp_dir / f"segment_{segment_num:05d}.ts"
+                cookie_header = get_cookie_header(self.session.cookies, requests.Request('GET', url))
+                headers = {'Cookie': cookie_header} if cookie_header else None
+                try:
+                    async with semaphore, session.get(url, headers=headers) as response:
+                        response.raise_for_status()
+                        if (response.content_length or 0) > STREAM_THRESHOLD:
+                            with open(output_path, 'wb') as f:
+                                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                                    f.write(chunk)
+                        else:
+                            output_path.write_bytes(await response.read())
+                    self._segment_done(f"Downloaded segment {segment_num}/{total}: {output_path.name}")
+                    return True
+                except Exception as e:
+                    self._log(f"Error downloading segment {segment_num}: {e}")
+                    return False
             
-            if not self.download_segment(url, segment_path, i, len(ts_urls)):
-                print(f"Warning: Failed to download segment {i}")
+            return await asyncio.gather(*(download(i, url) for i, url in enumerate(ts_urls, 1)))
+    
+    def download_all_segments(self, ts_urls: List[str], temp_dir: Path) -> Tuple[List[Path], List[int]]:
+        """
+        Download all TS segments to temporary directory in parallel
+        
+        Returns the ordered paths of the segments that downloaded and the numbers
+        of segments that still failed after a slower serial retry pass.
+        """
+        total = len(ts_urls)
+        # Build the ordered file list up front so concatenation order does not
+        # depend on which download finishes first
+        jobs = [(i, url, temp_dir / f"segment_{i:05d}.ts") for i, url in enumerate(ts_urls, 1)]
+        downloaded_files = [path for _, _, path in jobs]
+        
+        concurrency = self.async_concurrency if AIOHTTP_AVAILABLE else self.max_workers
+        print(f"\nDownloading {total} segments ({concurrency} at a time)...")
+        with self._show_progress(total):
+            if AIOHTTP_AVAILABLE:
+                try:
+                    asyncio.get_running_loop()
+                except RuntimeError:
+                    results = asyncio.run(self._download_all_async(ts_urls, temp_dir))
+                else:
+                    # This thread already runs a loop (e.g. the Playwright driver
+                    # kept warm with keep_browser=True), so use a fresh thread
+                    with ThreadPoolExecutor(max_workers=1) as executor:
+                        results = executor.submit(asyncio.run, self._download_all_async(ts_urls, temp_dir)).result()
+                failed = [i for i, ok in enumerate(results, 1) if not ok]
+            else:
+                failed = []
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    futures = {
+                        executor.submit(self.download_segment, url, path, i, total): i
+                        for i, url, path in jobs
+                    }
+                    for future in as_completed(futures):
+                        if not future.result():
+                            failed.append(futures[future])
+        
+            # Give the stragglers one more, slower chance instead of losing them
+            if failed:
+                self._log(f"Retrying {len(failed)} failed segment(s)...")
+                failed = [
+                    i for i in sorted(failed)
+                    if not self.download_segment(ts_urls[i - 1], downloaded_files[i - 1], i, total,
+                                                 timeout=RETRY_TIMEOUT)
+                ]
+                for i in failed:
+                    self._log(f"Warning: Failed to download segment {i}")
         
-        return downloaded_files
+        if failed:
+            # Consumers can then use the list as-is, without checking each file exists
+            missing = set(failed)
+            downloaded_files = [path for i, path in enumerate(downloaded_files, 1) if i not in missing]
+        
+        return downloaded_files, failed
     
     def concatenate_with_ffmpeg(self, segment_files: List[Path], output_path: Path) -> bool:
         """Concatenate TS segments using ffmpeg"""
+        if not segment_files:
+            print("Error: No segments to concatenate")
+            return False
         try:
-            # Create a file list for ffmpeg concat
-            concat_file = segment_files[0].parent / "concat_list.txt"
-            with open(concat_file, 'w') as f:
-                for seg_file in segment_files:
-                    if seg_file.exists():
-                        # Escape single quotes and use absolute path
-                        abs_path = seg_file.resolve()
-                        f.write(f"file '{abs_path}'\n")
+            # Create a file list for ffmpeg concat. Segments share one directory,
+            # so resolve it once rather than each segment path.
+            segment_dir = segment_files[0].parent.resolve()
+            concat_file = segment_dir / "concat_list.txt"
+            lines = [f"file '{segment_dir / seg_file.name}'" for seg_file in segment_files]
+            concat_file.write_text('\n'.join(lines) + '\n')
             
             # Use ffmpeg to concatenate and convert
             cmd = [
@@ -404,7 +808,7 @@ class MediaspaceDownloader:
                 str(output_path)
             ]
             
-            print(f"\nConcatenating segments and converting to MP4...")
+            print(f"\nConcatenating segments and converting to {output_path.suffix[1:].upper()}...")
             result = subprocess.run(cmd, capture_output=True, text=True)
             
             if result.returncode == 0:
@@ -422,14 +826,129 @@ class MediaspaceDownloader:
             print(f"Error concatenating files: {e}")
             return False
     
+    def _stream_segments(self, ts_urls: List[str], write) -> List[int]:
+        """Download segments in parallel and pass each one to write() in playlist order"""
+        total = len(ts_urls)
+        pending = deque()
+        failed = []
+        
+        def write_next():
+            # Segments are written strictly in order; later ones keep downloading meanwhile
+            segment_num, url, future = pending.popleft()
+            data = future.result()
+            if data is None:
+                # One slower retry before leaving a gap in the output
+                data = self.fetch_segment(url, segment_num, total, timeout=RETRY_TIMEOUT)
+            if data is None:
+                self._log(f"Warning: Failed to download segment {segment_num}")
+                failed.append(segment_num)
+            else:
+                write(data)
+        
+        with self._show_progress(total), ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                for i, url in enumerate(ts_urls, 1):
+                    pending.append((i, url, executor.submit(self.fetch_segment, url, i, total)))
+                    if len(pending) >= STREAM_WINDOW:
+                        write_next()
+                while pending:
+                    write_next()
+            finally:
+                # Only non-empty after an error; don't start downloads nobody will write
+                for _, _, future in pending:
+                    future.cancel()
+        
+        return failed
+    
+    def download_streaming(self, ts_urls: List[str], output_path: Path) -> bool:
+        """Download segments in parallel and append them to a .ts file in playlist order"""
+        print(f"\nStreaming {len(ts_urls)} segments into {output_path} ({self.max_workers} at a time)...")
+        try:
+            with open(output_path, 'wb') as outfile:
+                failed = self._stream_segments(ts_urls, outfile.write)
+        except Exception as e:
+            print(f"Error streaming segments: {e}")
+            return False
+        
+        if len(failed) == len(ts_urls):
+            print("Error: None of the segments could be downloaded")
+            if output_path.exists():
+                output_path.unlink()
+            return False
+        if failed:
+            print(f"Warning: {len(failed)} segment(s) could not be downloaded; the video will have gaps")
+        print(f"Saved to: {output_path}")
+        return True
+    
+    def concatenate_streaming(self, ts_urls: List[str], output_path: Path) -> bool:
+        """Download segments in parallel and pipe them into ffmpeg in playlist order"""
+        cmd = [
+            'ffmpeg',
+            '-f', 'mpegts',
+            '-i', 'pipe:0',
+            '-c', 'copy',
+            '-y',  # Overwrite output file
+            str(output_path)
+        ]
+        if output_path.suffix.lower() in ('.mp4', '.mov', '.m4v'):
+            # Put the index up front so players can start before the file is fully read
+            cmd[-2:-2] = ['-movflags', '+faststart']
+        
+        print(f"\nStreaming {len(ts_urls)} segments into ffmpeg ({self.max_workers} at a time)...")
+        # ffmpeg's log goes to a temp file so a full stderr pipe can never stall it
+        with tempfile.TemporaryFile() as log:
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=log)
+            try:
+                failed = self._stream_segments(ts_urls, proc.stdin.write)
+                if len(failed) == len(ts_urls):
+                    # Nothing reached ffmpeg; don't let it write an empty file
+                    proc.kill()
+                    proc.wait()
+                    print("Error: None of the segments could be downloaded")
+                    if output_path.exists():
+                        output_path.unlink()
+                    return False
+                proc.stdin.close()
+                if failed:
+                    print(f"Warning: {len(failed)} segment(s) could not be downloaded; the video will have gaps")
+            except Exception as e:
+                proc.kill()
+                print(f"Error streaming segments: {e}")
+            
+            returncode = proc.wait()
+            if returncode == 0:
+                print(f"Successfully created: {output_path}")
+                return True
+            log.seek(0)
+            print(f"FFmpeg error: {log.read().decode(errors='replace')}")
+        
+        # Like the on-disk path, still deliver the video as raw TS when ffmpeg fails
+        if output_path.exists():
+            output_path.unlink()
+        print("Falling back to a raw TS file...")
+        return self.download_streaming(ts_urls, output_path.with_suffix('.ts'))
+    
     def concatenate_simple(self, segment_files: List[Path], output_path: Path) -> bool:
         """Simple binary concatenation (fallback if ffmpeg fails)"""
+        if not segment_files:
+            print("Error: No segments to concatenate")
+            return False
         try:
             print(f"\nConcatenating segments (simple method)...")
             with open(output_path, 'wb') as outfile:
                 for seg_file in segment_files:
-                    if seg_file.exists():
-                        with open(seg_file, 'rb') as infile:
+                    with open(seg_file, 'rb') as infile:
+                        if SENDFILE_AVAILABLE:
+                            # Zero-copy: the kernel moves the bytes file to file,
+                            # asking for the whole remaining segment each call
+                            size = os.fstat(infile.fileno()).st_size
+                            offset = 0
+                            while offset < size:
+                                sent = os.sendfile(outfile.fileno(), infile.fileno(), offset, size - offset)
+                                if not sent:
+                                    break
+                                offset += sent
+                        else:
                             shutil.copyfileobj(infile, outfile)
             
             print(f"Concatenated to: {output_path}")
@@ -440,34 +959,48 @@ class MediaspaceDownloader:
             print(f"Error concatenating files: {e}")
             return False
     
-    def download_video(self, url: str, output_filename: Optional[str] = None, debug: bool = False) -> bool:
-        """Main method to download video from Mediaspace URL"""
+    def download_video(self, url: str, output_filename: Optional[str] = None, debug: bool = False,
+                       show_browser: bool = False, container: Optional[str] = None,
+                       in_memory: bool = True) -> bool:
+        """
+        Main method to download video from Mediaspace URL
+        
+        container is 'ts' (raw segments joined without ffmpeg) or one of
+        REMUX_CONTAINERS such as 'mp4' (remuxed with ffmpeg). By default it follows
+        the extension of output_filename, falling back to 'ts'.
+        With in_memory segments go straight from the network into the output in
+        playlist order; otherwise they are downloaded to a temporary directory first.
+        """
         print(f"Starting download from: {url}")
         
         # Step 1: Extract Kaltura link and get M3U8 URL
         print("\nStep 1: Extracting Kaltura link and finding M3U8 playlist...")
         
-        # Check if URL is already an M3U8 URL
-        if url.endswith('.m3u8') or '.m3u8?' in url or '/a.m3u8' in url:
-            print("URL is already an M3U8 playlist, using directly")
-            m3u8_url = url
-        else:
-            # First try to extract Kaltura link specifically
-            kaltura_url = self.extract_kaltura_link(url, debug=debug)
-            if kaltura_url:
-                print(f"✓ Extracted Kaltura M3U8 link: {kaltura_url}")
-                m3u8_url = kaltura_url
+        try:
+            # Check if URL is already an M3U8 URL
+            if self._is_playlist_url(url):
+                print("URL is already an M3U8 playlist, using directly")
+                m3u8_url = url
             else:
-                # Fallback to general M3U8 extraction
-                if debug:
-                    print("Kaltura extraction failed, trying general M3U8 extraction...")
-                m3u8_url = self.get_m3u8_url(url, debug=debug)
-                if not m3u8_url:
-                    print("Error: Could not find M3U8 playlist URL")
-                    print("Please provide either:")
-                    print("  - A Mediaspace page URL")
-                    print("  - A direct M3U8 playlist URL")
-                    return False
+                # First try to extract Kaltura link specifically
+                kaltura_url = self.extract_kaltura_link(url, debug=debug, show_browser=show_browser)
+                if kaltura_url:
+                    print(f"✓ Extracted Kaltura M3U8 link: {kaltura_url}")
+                    m3u8_url = kaltura_url
+                else:
+                    # Fallback to general M3U8 extraction
+                    if debug:
+                        print("Kaltura extraction failed, trying general M3U8 extraction...")
+                    m3u8_url = self.get_m3u8_url(url, debug=debug)
+                    if not m3u8_url:
+                        print("Error: Could not find M3U8 playlist URL")
+                        print("Please provide either:")
+                        print("  - A Mediaspace page URL")
+                        print("  - A direct M3U8 playlist URL")
+                        return False
+        finally:
+            # The page is only needed while looking for the playlist
+            self._page_cache.clear()
         
         print(f"Found M3U8: {m3u8_url}")
         
@@ -480,32 +1013,57 @@ class MediaspaceDownloader:
             return False
         
         print(f"Found {len(ts_urls)} segments")
+        self.prewarm_dns(ts_urls[0])
+        
+        if not output_filename:
+            # Generate filename from URL
+            parsed_url = urlparse(url)
+            path_parts = [p for p in parsed_url.path.split('/') if p]
+            if path_parts:
+                # For URLs like /media/L5+3000A/1_3e140s7n, use the last part
+                output_filename = path_parts[-1]
+                # Clean up the filename
+                output_filename = output_filename.replace('+', '_').replace(' ', '_')
+            else:
+                output_filename = "video"
+        
+        # Make the file extension match the container actually written
+        base, ext = os.path.splitext(output_filename)
+        ext = ext.lower()[1:]
+        if ext not in ('ts',) + REMUX_CONTAINERS:
+            # Not a video extension (e.g. a dotted title); keep the whole name
+            base, ext = output_filename, None
+        if container is None:
+            container = ext or 'ts'
+        output_path = self.output_dir / f"{base}.{container}"
+        
+        # Step 3: Stream segments straight into the output, no temporary files needed
+        if in_memory:
+            print(f"\nStep 3: Downloading and stitching segments into {output_path}...")
+            if container == 'ts':
+                return self.download_streaming(ts_urls, output_path)
+            if shutil.which('ffmpeg'):
+                return self.concatenate_streaming(ts_urls, output_path)
+            print("ffmpeg not found, saving the raw TS stream instead")
+            return self.download_streaming(ts_urls, output_path.with_suffix('.ts'))
         
-        # Step 3: Download all segments
         temp_dir = Path(tempfile.mkdtemp(prefix="mediaspace_"))
         print(f"\nStep 3: Downloading segments to {temp_dir}...")
         
         try:
-            segment_files = self.download_all_segments(ts_urls, temp_dir)
-            
-            # Step 4: Concatenate and convert
-            if not output_filename:
-                # Generate filename from URL
-                parsed_url = urlparse(url)
-                path_parts = [p for p in parsed_url.path.split('/') if p]
-                if path_parts:
-                    # For URLs like /media/L5+3000A/1_3e140s7n, use the last part
-                    output_filename = path_parts[-1]
-                    # Clean up the filename
-                    output_filename = output_filename.replace('+', '_').replace(' ', '_')
-                else:
-                    output_filename = "video"
-                if not output_filename.endswith('.mp4'):
-                    output_filename += '.mp4'
-            
-            output_path = self.output_dir / output_filename
+            segment_files, failed = self.download_all_segments(ts_urls, temp_dir)
+            if not segment_files:
+                print("Error: None of the segments could be downloaded")
+                return False
+            if failed:
+                print(f"Warning: {len(failed)} segment(s) could not be downloaded; the video will have gaps")
             
+            # Step 4: Concatenate (and convert when MP4 was requested)
             print(f"\nStep 4: Stitching segments together...")
+            if container == 'ts':
+                # MPEG-TS segments join into a playable stream as-is
+                return self.concatenate_simple(segment_files, output_path)
+            
             success = self.concatenate_with_ffmpeg(segment_files, output_path)
             
             if not success:
@@ -531,12 +1089,28 @@ def main():
         url = args[0]
         output_filename = None
         debug = False
+        show_browser = False
+        container = None
+        in_memory = True
         
-        for arg in args[1:]:
+        options = iter(args[1:])
+        for arg in options:
             if arg == '--debug':
                 debug = True
+            elif arg == '--show-browser':
+                show_browser = True
+            elif arg == '--on-disk':
+                in_memory = False
+            elif arg == '--container':
+                container = next(options, None)
+            elif arg.startswith('--container='):
+                container = arg.split('=', 1)[1]
             elif not arg.startswith('--'):
                 output_filename = arg
+        
+        if container not in (None, 'ts') + REMUX_CONTAINERS:
+            print(f"Error: --container must be one of: {', '.join(('ts',) + REMUX_CONTAINERS)}")
+            sys.exit(1)
     else:
         # Interactive mode - prompt user for input
         print("=" * 60)
@@ -558,10 +1132,14 @@ def main():
         # Optionally enable debug mode
         debug_input = input("Enable debug mode? (y/N): ").strip().lower()
         debug = debug_input in ['y', 'yes']
+        show_browser = False
+        container = None
+        in_memory = True
         print()
     
     downloader = MediaspaceDownloader()
-    success = downloader.download_video(url, output_filename, debug=debug)
+    success = downloader.download_video(url, output_filename, debug=debug, show_browser=show_browser,
+                                        container=container, in_memory=in_memory)
     
     if success:
         print("\n✓ Download complete!")